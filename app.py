@@ -7,35 +7,78 @@ to scan radio frequencies, an Ollama model to analyze the content,
 and logs the findings.
 """
 
+# Gevent must patch the standard library before anything else is imported
+from gevent import monkey
+monkey.patch_all()
+
+import atexit
 import csv
+import hashlib
+import io
 import subprocess
 import json
 from datetime import datetime
+import numpy as np
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 import time
 import os
 import re
 from flask import Flask, render_template
 from flask_socketio import SocketIO, emit
-from threading import Thread, Event
+from threading import Event
+from collections import OrderedDict
+from libhackrf import HackRFSweep, HackRFError
 
 # --- Flask App Initialization ---
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'secret!'
-socketio = SocketIO(app, async_mode='threading')
+socketio = SocketIO(app, async_mode='gevent')
 
 # --- Configuration ---
 OLLAMA_API_URL = "http://localhost:11434/api/generate"
 OLLAMA_MODEL = "gamma:1b"
+OLLAMA_KEEP_ALIVE = "1h"  # Keep the model loaded between scan cycles
+OLLAMA_NUM_PREDICT = 128  # Upper bound on generated tokens; enough for the JSON answer
+OLLAMA_CACHE_FILE = "ollama_cache.json"
+OLLAMA_CACHE_SIZE = 1024  # Maximum number of memoized Ollama analyses
 LOG_FILE = "rf_scan_log.csv"
 SCAN_RANGE_MHZ = ("100", "400")
 SCAN_BIN_WIDTH_HZ = 100000
 SCAN_NUM_SAMPLES = 131072
+SCAN_PERIOD_S = 10  # Target time between the start of consecutive scan cycles
+SWEEP_TIMEOUT_S = 30  # Maximum time to wait for the HackRF to complete a fresh sweep
+LOG_BATCH_SIZE = 5  # Number of logged signals buffered before writing them to disk
+LOG_FLUSH_S = 30  # Buffered signals are written at least this often, checked once per scan cycle
+
+# Static instructions sent as the system prompt, so Ollama can reuse the cached prefix every cycle
+OLLAMA_SYSTEM_PROMPT = (
+    "You are an RF expert responsible for identifying signals and configuring a receiver. "
+    "You will be given a detected signal and the current receiver gains. "
+    "The signal is weak if dBm is below -40, strong if above -15. "
+    "Return a JSON object with two string keys. "
+    "'description': the most likely type of signal, service, "
+    "and modulation (e.g., NFM, AM, FSK), concisely. "
+    "'suggestions': new integer values for LNA gain (0-40) and VGA gain (0-62) to optimize reception, "
+    "formatted as 'New settings: LNA gain <value>, VGA gain <value>'."
+)
+
+# Saved analyses are only reused with the model and instructions that produced them
+OLLAMA_CACHE_SIGNATURE = {
+    "model": OLLAMA_MODEL,
+    "system_prompt_sha256": hashlib.sha256(OLLAMA_SYSTEM_PROMPT.encode()).hexdigest()
+}
+
+# --- Precompiled Patterns ---
+_MOD_RE = re.compile(r'\b(FM|NFM|WFM|AM|SSB|LSB|USB|FSK|PSK|QAM)\b', re.IGNORECASE)
+_LNA_RE = re.compile(r'LNA gain (\d+)', re.IGNORECASE)
+_VGA_RE = re.compile(r'VGA gain (\d+)', re.IGNORECASE)
 
 class RFAnalyzer:
     """
     Main class for the autonomous RF analyzer.
-    Now designed to run in a background thread and emit updates via SocketIO.
+    Now designed to run as a cooperative background task and emit updates via SocketIO.
     """
 
     def __init__(self, stop_event):
@@ -43,7 +86,29 @@ class RFAnalyzer:
         self.vga_gain = 20
         self.amp_enabled = False
         self.stop_event = stop_event
+        self._pending_rows = []
+        self._last_flush = time.monotonic()
+        # The sweep runs continuously, through libhackrf when available and hackrf_sweep otherwise
+        self._use_libhackrf = True
+        self._hackrf = None
+        self.sweep_proc = None
+        self._sweep_dirty = True
+        self._sweep_ready = Event()
+        self._latest_sweep = None
+        self._sweep_message = ""
+        self._status_task = None
+        # Reuse keep-alive connections to Ollama instead of reconnecting on every call
+        self.http = requests.Session()
+        self.http.headers.update({'Content-Type': 'application/json'})
+        self.http.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=4))
+        # Ollama answers memoized by quantized signal and gains, kept warm across restarts
+        self._analysis_cache = self._load_analysis_cache()
+        atexit.register(self._save_analysis_cache)
         self._init_log_file()
+        # Keep the log open for the analyzer lifetime instead of reopening it on every flush
+        self._log_fh = open(LOG_FILE, 'a', newline='', buffering=1 << 16)
+        self._log_writer = csv.writer(self._log_fh)
+        atexit.register(self._close_log)
 
     def _init_log_file(self):
         if not os.path.exists(LOG_FILE):
@@ -56,11 +121,125 @@ class RFAnalyzer:
                     "Decoded Data"
                 ])
 
+    def _load_analysis_cache(self):
+        cache = OrderedDict()
+        if os.path.exists(OLLAMA_CACHE_FILE):
+            try:
+                with open(OLLAMA_CACHE_FILE) as f:
+                    saved = json.load(f)
+                if isinstance(saved, dict) and saved.get("signature") == OLLAMA_CACHE_SIGNATURE:
+                    for key, value in saved["entries"]:
+                        cache[tuple(key)] = tuple(value)
+                else:
+                    print("Discarding Ollama cache file from a different model or system prompt.")
+            except (OSError, ValueError, TypeError, KeyError) as e:
+                print(f"Ignoring unreadable Ollama cache file: {e}")
+        return cache
+
+    def _save_analysis_cache(self):
+        try:
+            with open(OLLAMA_CACHE_FILE, 'w') as f:
+                json.dump({
+                    "signature": OLLAMA_CACHE_SIGNATURE,
+                    "entries": [[list(key), list(value)] for key, value in self._analysis_cache.items()]
+                }, f)
+        except OSError as e:
+            print(f"Could not save Ollama cache file: {e}")
+
     def _emit_log(self, message):
         """Helper to print and emit a log message."""
         print(message)
         socketio.emit('log', {'data': message})
 
+    def _start_sweep(self):
+        """(Re)starts hackrf_sweep in continuous mode with the current gain settings."""
+        self._stop_sweep()
+        command = [
+            'hackrf_sweep', '-f', f'{SCAN_RANGE_MHZ[0]}:{SCAN_RANGE_MHZ[1]}',
+            '-l', str(self.lna_gain), '-g', str(self.vga_gain),
+            '-w', str(SCAN_BIN_WIDTH_HZ), '-n', str(SCAN_NUM_SAMPLES)
+        ]
+        if self.amp_enabled: command.append('-a')
+
+        # stdout is block buffered and stderr is not, so they are read from separate pipes
+        # to keep status lines from being spliced into CSV rows
+        self.sweep_proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=1 << 16)
+        self._sweep_dirty = False
+        self._latest_sweep = None
+        self._sweep_message = ""
+        socketio.start_background_task(self._read_sweeps, self.sweep_proc)
+        self._status_task = socketio.start_background_task(self._read_status, self.sweep_proc)
+
+    def _stop_sweep(self):
+        if self._hackrf:
+            self._hackrf.close()
+            self._hackrf = None
+        if self.sweep_proc and self.sweep_proc.poll() is None:
+            self.sweep_proc.terminate()
+            self.sweep_proc.wait()
+        self.sweep_proc = None
+
+    def _read_sweeps(self, process):
+        """Consumes hackrf_sweep output, publishing each complete sweep as a list of raw CSV lines."""
+        # The output is plain ASCII, so it is kept as bytes and never decoded line by line
+        start_hz = int(SCAN_RANGE_MHZ[0]) * 1_000_000
+        # Each block of the first tuning prints a row at the start frequency and one 10 MHz above it
+        first_tuning = (start_hz, start_hz + 10_000_000)
+        rows, started, in_first_tuning, field_count = [], False, False, None
+        for line in process.stdout:
+            try:
+                hz_low = int(line.split(b',', 3)[2])
+            except (IndexError, ValueError):
+                continue
+            # Every row of a run has the same number of bins, so a row of any other width is damaged
+            if field_count is None:
+                field_count = line.count(b',')
+            elif line.count(b',') != field_count:
+                continue
+            # Interleaved tunings make hz_low step back within a sweep, and every block of
+            # a tuning repeats its rows, so only entering the first tuning begins a new one
+            was_in_first_tuning, in_first_tuning = in_first_tuning, hz_low in first_tuning
+            if in_first_tuning and not was_in_first_tuning:
+                if rows and process is self.sweep_proc:  # Drop output still buffered from a replaced process
+                    self._latest_sweep = rows
+                    self._sweep_ready.set()
+                rows, started = [], True
+            if started:
+                rows.append(line)
+        process.wait()
+        if process is self.sweep_proc:
+            self._sweep_ready.set()  # Wake run_scan so it notices the process has exited
+
+    def _read_status(self, process):
+        """Drains hackrf_sweep's stderr, keeping its last status or error line."""
+        for line in process.stderr:
+            line = line.decode('ascii', 'replace').strip()
+            if line and process is self.sweep_proc:
+                self._sweep_message = line
+
+    def _scan_libhackrf(self):
+        if self._hackrf is None:
+            self._hackrf = HackRFSweep(int(SCAN_RANGE_MHZ[0]), int(SCAN_RANGE_MHZ[1]), SCAN_BIN_WIDTH_HZ, SCAN_NUM_SAMPLES)
+            self._hackrf.start(self.lna_gain, self.vga_gain, self.amp_enabled)
+        elif self._sweep_dirty:
+            # libhackrf applies new gains to the running sweep, so no restart is needed
+            self._hackrf.set_gains(self.lna_gain, self.vga_gain)
+        self._sweep_dirty = False
+
+        strongest = self._hackrf.wait_for_strongest(SWEEP_TIMEOUT_S)
+        if strongest is None: return None
+        frequency_hz, dbm = strongest
+        return self._report_signal(frequency_hz, dbm, self._hackrf.bin_width_hz)
+
+    def _report_signal(self, frequency_hz, dbm, bin_width):
+        signal_data = {
+            "frequency_mhz": float(frequency_hz) / 1_000_000,
+            "power_db": float(dbm),
+            "bandwidth_hz": int(bin_width)
+        }
+        self._emit_log(f"Strongest signal found at {signal_data['frequency_mhz']:.3f} MHz with {signal_data['power_db']:.2f} dBm")
+        return signal_data
+
     def run_scan(self):
         status = (
             f"Scanning from {SCAN_RANGE_MHZ[0]} MHz to {SCAN_RANGE_MHZ[1]} MHz... "
@@ -68,88 +247,114 @@ class RFAnalyzer:
         )
         self._emit_log(status)
 
-        command = [
-            'hackrf_sweep', '-f', f'{SCAN_RANGE_MHZ[0]}:{SCAN_RANGE_MHZ[1]}',
-            '-l', str(self.lna_gain), '-g', str(self.vga_gain),
-            '-w', str(SCAN_BIN_WIDTH_HZ), '-n', str(SCAN_NUM_SAMPLES)
-        ]
-        if self.amp_enabled: command.append('-a')
+        if self._use_libhackrf:
+            try:
+                return self._scan_libhackrf()
+            except HackRFError as e:
+                self._emit_log(f"libhackrf sweep unavailable ({e}); falling back to hackrf_sweep.")
+                self._use_libhackrf = False
+                self._stop_sweep()
 
         try:
-            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            stdout, stderr = process.communicate()
+            if self.sweep_proc is None or self._sweep_dirty:
+                self._start_sweep()
 
-            if process.returncode != 0:
-                error_msg = f"Error executing hackrf_sweep: {stderr.strip()}"
+            # Wait for a sweep that completes after this call, so stale data is never used
+            self._sweep_ready.clear()
+            self._sweep_ready.wait(SWEEP_TIMEOUT_S)
+
+            if self.sweep_proc.poll() is not None:
+                self._status_task.join(1)  # Let the last error line arrive
+                error_msg = f"Error executing hackrf_sweep: {self._sweep_message}"
                 self._emit_log(error_msg)
+                self.sweep_proc = None
                 return None
 
-            lines = stdout.strip().split('\n')
-            if len(lines) < 2: return None
-
-            reader = csv.reader(lines)
-            next(reader)  # Skip header
-
-            strongest_signal = max(
-                (row for row in reader if len(row) > 6),
-                key=lambda r: float(r[6]),
-                default=None
-            )
-
-            if strongest_signal:
-                hz_low, hz_high, bin_width, dbm = int(strongest_signal[2]), int(strongest_signal[3]), int(strongest_signal[4]), float(strongest_signal[6])
-                signal_data = {
-                    "frequency_mhz": (hz_low + hz_high) / 2 / 1_000_000,
-                    "power_db": dbm,
-                    "bandwidth_hz": bin_width
-                }
-                self._emit_log(f"Strongest signal found at {signal_data['frequency_mhz']:.3f} MHz with {signal_data['power_db']:.2f} dBm")
-                return signal_data
+            lines, self._latest_sweep = self._latest_sweep, None
+            if not lines: return None
+
+            # Parse the sweep columns (hz_low, hz_high, bin_width, dB) straight into an array
+            try:
+                sweep = np.loadtxt(io.BytesIO(b''.join(lines)), delimiter=',', usecols=(2, 3, 4, 6), ndmin=2)
+            except ValueError as e:
+                self._emit_log(f"Skipping malformed hackrf_sweep output: {e}")
+                return None
+
+            if sweep.size:
+                hz_low, hz_high, bin_width, dbm = sweep[sweep[:, 3].argmax()]
+                return self._report_signal(float(hz_low + hz_high) / 2, dbm, bin_width)
             return None
 
         except FileNotFoundError:
             self._emit_log("Error: 'hackrf_sweep' not found. Please ensure hackrf-tools is installed and in your system's PATH.")
-            self.stop_event.set() # Stop the thread if the tool is not found
+            self.stop_event.set() # Stop the task if the tool is not found
             return None
 
     def _query_ollama(self, prompt):
         try:
-            response = requests.post(OLLAMA_API_URL, json={"model": OLLAMA_MODEL, "prompt": prompt, "stream": False}, timeout=30)
+            payload = orjson.dumps({
+                "model": OLLAMA_MODEL,
+                "system": OLLAMA_SYSTEM_PROMPT,
+                "prompt": prompt,
+                "stream": False,
+                "format": "json",
+                "keep_alive": OLLAMA_KEEP_ALIVE,
+                "options": {"num_predict": OLLAMA_NUM_PREDICT}
+            })
+            response = self.http.post(OLLAMA_API_URL, data=payload, timeout=30)
             response.raise_for_status()
-            return response.json().get("response", "").strip()
-        except requests.exceptions.RequestException as e:
+            return orjson.loads(response.content).get("response", "").strip()
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
             self._emit_log(f"Error communicating with Ollama API: {e}")
             return None
 
     def analyze_with_ollama(self, signal_data):
         self._emit_log(f"Analyzing signal at {signal_data['frequency_mhz']:.3f} MHz with Ollama...")
 
-        desc_prompt = (
-            f"You are an RF expert. A signal has been detected. "
-            f"Frequency: {signal_data['frequency_mhz']:.3f} MHz, "
-            f"Power: {signal_data['power_db']:.2f} dBm, "
-            f"Bandwidth: {signal_data['bandwidth_hz'] / 1000} kHz. "
-            f"Based on this, what is the most likely type of signal, service, "
-            f"and modulation (e.g., NFM, AM, FSK)? Be concise."
-        )
-        description = self._query_ollama(desc_prompt) or "Analysis failed."
-
-        sugg_prompt = (
-            f"You are an RF expert responsible for configuring a receiver. "
-            f"A signal at {signal_data['frequency_mhz']:.3f} MHz has a power of {signal_data['power_db']:.2f} dBm. "
-            f"Current gains are LNA: {self.lna_gain}dB, VGA: {self.vga_gain}dB. "
-            f"Suggest new integer values for LNA gain (0-40) and VGA gain (0-62) to optimize reception. "
-            f"The signal is weak if dBm is below -40, strong if above -15. "
-            f"Format your response as: 'New settings: LNA gain <value>, VGA gain <value>' and nothing else."
+        # The suggestions depend on the current gains, so they are part of the key
+        cache_key = (
+            round(signal_data['frequency_mhz'], 1), round(signal_data['power_db']),
+            signal_data['bandwidth_hz'], self.lna_gain, self.vga_gain
         )
-        suggestions = self._query_ollama(sugg_prompt) or "No suggestions."
-
+        cached = self._analysis_cache.get(cache_key)
+        if cached:
+            self._analysis_cache.move_to_end(cache_key)
+            description, suggestions = cached
+            self._emit_log("Reusing cached Ollama analysis for a matching signal.")
+        else:
+            description, suggestions = self._query_analysis(signal_data)
+            if description and suggestions:
+                self._analysis_cache[cache_key] = (description, suggestions)
+                if len(self._analysis_cache) > OLLAMA_CACHE_SIZE:
+                    self._analysis_cache.popitem(last=False)
+
+        description = description or "Analysis failed."
+        suggestions = suggestions or "No suggestions."
         self._emit_log(f"Ollama Description: {description}")
         self._emit_log(f"Ollama Suggestions: {suggestions}")
         return description, suggestions
 
+    def _query_analysis(self, signal_data):
+        # A single request answers both questions; only the signal data changes between cycles
+        prompt = (
+            f"Frequency: {signal_data['frequency_mhz']:.3f} MHz, "
+            f"Power: {signal_data['power_db']:.2f} dBm, "
+            f"Bandwidth: {signal_data['bandwidth_hz'] / 1000} kHz, "
+            f"LNA gain: {self.lna_gain}dB, VGA gain: {self.vga_gain}dB."
+        )
+        response = self._query_ollama(prompt)
+        if response is None:
+            return None, None
+
+        try:
+            analysis = orjson.loads(response)
+            return str(analysis.get("description", "")).strip(), str(analysis.get("suggestions", "")).strip()
+        except (orjson.JSONDecodeError, AttributeError) as e:
+            self._emit_log(f"Ollama returned an unexpected analysis format: {e}")
+            return None, None
+
     def _extract_modulation(self, description):
-        match = re.search(r'\b(FM|NFM|WFM|AM|SSB|LSB|USB|FSK|PSK|QAM)\b', description, re.IGNORECASE)
+        match = _MOD_RE.search(description)
         return match.group(1).upper() if match else "Unknown"
 
     def decode_signal(self, signal_data, modulation):
@@ -163,12 +368,11 @@ class RFAnalyzer:
             self.lna_gain, self.vga_gain, self.amp_enabled,
             description, suggestions, decoded_data
         ]
-        with open(LOG_FILE, 'a', newline='') as f:
-            csv.writer(f).writerow(log_entry)
-        self._emit_log(f"Data for {signal['frequency_mhz']:.3f} MHz logged.")
+        self._pending_rows.append(log_entry)
+        self._emit_log(f"Data for {signal['frequency_mhz']:.3f} MHz queued for the log file.")
 
-        # Emit the new data for the web interface history table
-        socketio.emit('new_signal', {
+        # Send the new data to the web interface history table right away
+        socketio.emit('new_signals', {'rows': [{
             'timestamp': timestamp,
             'frequency': f"{signal['frequency_mhz']:.3f}",
             'modulation': modulation,
@@ -176,12 +380,26 @@ class RFAnalyzer:
             'vga_gain': self.vga_gain,
             'description': description,
             'suggestions': suggestions
-        })
-
+        }]})
+        if len(self._pending_rows) >= LOG_BATCH_SIZE:
+            self.flush_log()
+
+    def flush_log(self):
+        """Writes buffered log rows to the CSV file in one go."""
+        if self._pending_rows:
+            self._log_writer.writerows(self._pending_rows)
+            self._log_fh.flush()
+            self._pending_rows = []
+        self._last_flush = time.monotonic()
+
+    def _close_log(self):
+        self.flush_log()
+        self._log_fh.close()
 
     def adjust_settings(self, suggestions):
-        lna_match = re.search(r'LNA gain (\d+)', suggestions, re.IGNORECASE)
-        vga_match = re.search(r'VGA gain (\d+)', suggestions, re.IGNORECASE)
+        lna_match = _LNA_RE.search(suggestions)
+        vga_match = _VGA_RE.search(suggestions)
+        previous_gains = (self.lna_gain, self.vga_gain)
 
         if lna_match:
             self.lna_gain = max(0, min(int(lna_match.group(1)), 40))
@@ -190,9 +408,14 @@ class RFAnalyzer:
             self.vga_gain = max(0, min(int(vga_match.group(1)), 62))
             self._emit_log(f"Adjusted VGA gain to {self.vga_gain}")
 
+        # New gains only take effect once hackrf_sweep is restarted
+        if (self.lna_gain, self.vga_gain) != previous_gains:
+            self._sweep_dirty = True
+
     def start_analysis_loop(self):
         self._emit_log("--- Autonomous RF Analyzer Background Task Started ---")
         while not self.stop_event.is_set():
+            cycle_start = time.monotonic()
             signal = self.run_scan()
             if signal:
                 description, suggestions = self.analyze_with_ollama(signal)
@@ -203,8 +426,16 @@ class RFAnalyzer:
             else:
                 self._emit_log("No significant signals found in this sweep.")
 
-            self._emit_log("--- Waiting for next scan cycle (10s) ---")
-            self.stop_event.wait(10) # Use event.wait for graceful shutdown
+            # Checked every cycle so buffered rows are written even when no new signal arrives
+            if time.monotonic() - self._last_flush >= LOG_FLUSH_S:
+                self.flush_log()
+
+            # Only wait out what is left of the period; a slow analysis starts the next scan right away
+            remaining = max(0.0, SCAN_PERIOD_S - (time.monotonic() - cycle_start))
+            self._emit_log(f"--- Waiting for next scan cycle ({remaining:.1f}s) ---")
+            self.stop_event.wait(remaining) # Use event.wait for graceful shutdown
+        self._stop_sweep()
+        self.flush_log()
         self._emit_log("--- Analyzer background task stopped. ---")
 
 # --- Flask Routes and SocketIO Events ---
@@ -233,15 +464,16 @@ if __name__ == '__main__':
     stop_event = Event()
     analyzer = RFAnalyzer(stop_event)
 
-    # Start the analyzer in a background thread
-    analyzer_thread = Thread(target=analyzer.start_analysis_loop)
-    analyzer_thread.daemon = True
-    analyzer_thread.start()
+    # Start the analyzer as a cooperative background task alongside the server
+    analyzer_task = socketio.start_background_task(analyzer.start_analysis_loop)
 
     print("--- Starting Flask-SocketIO Server ---")
-    socketio.run(app, host='0.0.0.0', port=5000, debug=False, allow_unsafe_werkzeug=True)
+    try:
+        socketio.run(app, host='0.0.0.0', port=5000, debug=False)
+    except KeyboardInterrupt:
+        pass  # The gevent server does not catch Ctrl+C itself
 
     # Handle shutdown
     stop_event.set()
-    analyzer_thread.join()
+    analyzer_task.join()
     print("--- Server and analyzer stopped. ---")
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Minimal ctypes binding to libhackrf's sweep mode.
+
+Runs the same interleaved sweep as hackrf_sweep inside this process and keeps
+the power spectrum of the latest complete sweep in a NumPy array, so no
+hackrf_sweep process or CSV text output is involved.
+"""
+
+import ctypes
+import ctypes.util
+import time
+
+import numpy as np
+
+# --- Sweep Parameters (same values hackrf_sweep uses) ---
+SAMPLE_RATE_HZ = 20_000_000
+BASEBAND_FILTER_HZ = 15_000_000
+TUNE_STEP_MHZ = 20
+OFFSET_HZ = 7_500_000
+BYTES_PER_BLOCK = 16384
+SWEEP_STYLE_INTERLEAVED = 1
+SLOT_WIDTH_HZ = SAMPLE_RATE_HZ // 4  # Each tuning reports two quarter-band slots
+HACKRF_TRUE = 1
+
+# Power bins are stored as int16 hundredths of a dB, half the bytes of float32 for the argmax
+POWER_SCALE = 100
+EMPTY_BIN = np.iinfo(np.int16).min  # Marks bins not yet filled in the current sweep
+
+
+class HackRFError(Exception):
+    """Raised when libhackrf cannot be loaded or one of its calls fails."""
+
+
+class _Transfer(ctypes.Structure):
+    _fields_ = [
+        ("device", ctypes.c_void_p),
+        ("buffer", ctypes.POINTER(ctypes.c_uint8)),
+        ("buffer_length", ctypes.c_int),
+        ("valid_length", ctypes.c_int),
+        ("rx_ctx", ctypes.c_void_p),
+        ("tx_ctx", ctypes.c_void_p),
+    ]
+
+
+_SampleBlockCallback = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(_Transfer))
+
+
+def _load_library():
+    name = ctypes.util.find_library('hackrf')
+    if name is None:
+        raise HackRFError("libhackrf not found")
+    try:
+        lib = ctypes.CDLL(name)
+    except OSError as e:
+        raise HackRFError(f"could not load {name}: {e}") from e
+
+    device = ctypes.c_void_p
+    lib.hackrf_error_name.restype = ctypes.c_char_p
+    lib.hackrf_error_name.argtypes = [ctypes.c_int]
+    lib.hackrf_open.argtypes = [ctypes.POINTER(device)]
+    lib.hackrf_close.argtypes = [device]
+    lib.hackrf_is_streaming.argtypes = [device]
+    lib.hackrf_stop_rx.argtypes = [device]
+    lib.hackrf_set_sample_rate_manual.argtypes = [device, ctypes.c_uint32, ctypes.c_uint32]
+    lib.hackrf_set_baseband_filter_bandwidth.argtypes = [device, ctypes.c_uint32]
+    lib.hackrf_set_lna_gain.argtypes = [device, ctypes.c_uint32]
+    lib.hackrf_set_vga_gain.argtypes = [device, ctypes.c_uint32]
+    lib.hackrf_set_amp_enable.argtypes = [device, ctypes.c_uint8]
+    lib.hackrf_init_sweep.argtypes = [
+        device, ctypes.POINTER(ctypes.c_uint16), ctypes.c_int,
+        ctypes.c_uint32, ctypes.c_uint32, ctypes.c_uint32, ctypes.c_int
+    ]
+    lib.hackrf_start_rx_sweep.argtypes = [device, _SampleBlockCallback, ctypes.c_void_p]
+    return lib
+
+
+class HackRFSweep:
+    """
+    Continuous HackRF sweep over a frequency range.
+    The sample callback runs on libhackrf's USB thread and only touches NumPy
+    buffers; each finished sweep is published as a (slots, bins) power array.
+    """
+
+    def __init__(self, freq_min_mhz, freq_max_mhz, bin_width_hz, num_samples):
+        self._lib = _load_library()
+        step_count = 1 + (freq_max_mhz - freq_min_mhz - 1) // TUNE_STEP_MHZ
+        self._frequencies = (ctypes.c_uint16 * 2)(freq_min_mhz, freq_min_mhz + step_count * TUNE_STEP_MHZ)
+        self._start_hz = freq_min_mhz * 1_000_000
+        self._num_bytes = num_samples * 2
+
+        # hackrf_sweep rounds the FFT size up so that (size + 4) is a multiple of 8
+        fft_size = max(4, SAMPLE_RATE_HZ // bin_width_hz)
+        while (fft_size + 4) % 8:
+            fft_size += 1
+        self.fft_size = fft_size
+        self.bin_width_hz = SAMPLE_RATE_HZ / fft_size
+        self._window = np.hanning(fft_size).astype(np.float32)
+
+        slots = step_count * TUNE_STEP_MHZ * 1_000_000 // SLOT_WIDTH_HZ
+        self._power = np.full((slots, fft_size // 4), EMPTY_BIN, dtype=np.int16)
+        self._latest = None
+        self._sweep_started = False
+        self._last_frequency = None
+        self.sweep_count = 0
+
+        self._device = ctypes.c_void_p()
+        self._initialized = False
+        self._callback = _SampleBlockCallback(self._on_transfer)  # Must outlive the sweep
+
+    def _check(self, result, call):
+        if result != 0:
+            raise HackRFError(f"{call}() failed: {self._lib.hackrf_error_name(result).decode()} ({result})")
+
+    def start(self, lna_gain, vga_gain, amp_enabled):
+        lib = self._lib
+        self._check(lib.hackrf_init(), "hackrf_init")
+        self._initialized = True
+        try:
+            self._check(lib.hackrf_open(ctypes.byref(self._device)), "hackrf_open")
+            self._check(lib.hackrf_set_sample_rate_manual(self._device, SAMPLE_RATE_HZ, 1), "hackrf_set_sample_rate_manual")
+            self._check(lib.hackrf_set_baseband_filter_bandwidth(self._device, BASEBAND_FILTER_HZ), "hackrf_set_baseband_filter_bandwidth")
+            self.set_gains(lna_gain, vga_gain)
+            self._check(lib.hackrf_set_amp_enable(self._device, int(amp_enabled)), "hackrf_set_amp_enable")
+            self._check(lib.hackrf_init_sweep(
+                self._device, self._frequencies, 1, self._num_bytes,
+                TUNE_STEP_MHZ * 1_000_000, OFFSET_HZ, SWEEP_STYLE_INTERLEAVED
+            ), "hackrf_init_sweep")
+            self._check(lib.hackrf_start_rx_sweep(self._device, self._callback, None), "hackrf_start_rx_sweep")
+        except HackRFError:
+            self.close()
+            raise
+
+    def set_gains(self, lna_gain, vga_gain):
+        """Applies new gains to the device; takes effect without restarting the sweep."""
+        self._check(self._lib.hackrf_set_lna_gain(self._device, lna_gain), "hackrf_set_lna_gain")
+        self._check(self._lib.hackrf_set_vga_gain(self._device, vga_gain), "hackrf_set_vga_gain")
+
+    def close(self):
+        if self._device:
+            self._lib.hackrf_stop_rx(self._device)
+            self._lib.hackrf_close(self._device)
+            self._device = ctypes.c_void_p()
+        if self._initialized:
+            self._lib.hackrf_exit()
+            self._initialized = False
+
+    def _on_transfer(self, transfer_ptr):
+        transfer = transfer_ptr.contents
+        num_blocks = transfer.valid_length // BYTES_PER_BLOCK
+        data = np.ctypeslib.as_array(transfer.buffer, shape=(num_blocks * BYTES_PER_BLOCK,))
+        for block in data.reshape(num_blocks, BYTES_PER_BLOCK):
+            # Each block starts with 0x7F 0x7F and the little-endian tuning frequency
+            if block[0] != 0x7F or block[1] != 0x7F:
+                continue
+            frequency = int.from_bytes(block[2:10].tobytes(), 'little')
+            # Every block of a tuning repeats its header, so only the first block
+            # at the start frequency begins a new sweep
+            if frequency == self._start_hz and self._last_frequency != self._start_hz:
+                if self._sweep_started:
+                    self._publish()
+                self._sweep_started = True
+            self._last_frequency = frequency
+            if self._sweep_started:
+                self._accumulate(frequency, block)
+        return 0
+
+    def _accumulate(self, frequency, block):
+        # Like hackrf_sweep, only the last fft_size I/Q pairs of the block are transformed
+        iq = block[-2 * self.fft_size:].view(np.int8).astype(np.float32)
+        samples = (iq[0::2] + 1j * iq[1::2]) * self._window / 128
+        spectrum = np.fft.fft(samples) / self.fft_size
+        with np.errstate(divide='ignore'):
+            power = 10 * POWER_SCALE * np.log10(spectrum.real ** 2 + spectrum.imag ** 2)
+        power = np.clip(np.rint(power), EMPTY_BIN, np.iinfo(np.int16).max).astype(np.int16)
+
+        # The tuning covers [f, f + 5 MHz] and [f + 10 MHz, f + 15 MHz], taken from these FFT bins
+        quarter = self.fft_size // 4
+        slot = (frequency - self._start_hz) // SLOT_WIDTH_HZ
+        for slot_offset, first_bin in ((0, 1 + (self.fft_size * 5) // 8), (2, 1 + self.fft_size // 8)):
+            if 0 <= slot + slot_offset < len(self._power):
+                self._power[slot + slot_offset] = power[first_bin:first_bin + quarter]
+
+    def _publish(self):
+        self._latest = self._power
+        self._power = np.full_like(self._latest, EMPTY_BIN)
+        self.sweep_count += 1
+
+    def wait_for_strongest(self, timeout):
+        """
+        Waits for a sweep that completes after this call and returns the
+        (frequency_hz, dbm) of its strongest bin, or None on timeout.
+        """
+        count = self.sweep_count
+        deadline = time.monotonic() + timeout
+        while self.sweep_count == count:
+            if self._lib.hackrf_is_streaming(self._device) != HACKRF_TRUE:
+                raise HackRFError("HackRF stopped streaming")
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(0.05)
+
+        power = self._latest
+        slot, bin_index = np.unravel_index(power.argmax(), power.shape)
+        if power[slot, bin_index] == EMPTY_BIN:
+            return None
+        dbm = power[slot, bin_index] / POWER_SCALE
+        frequency_hz = self._start_hz + slot * SLOT_WIDTH_HZ + (bin_index + 0.5) * self.bin_width_hz
+        return frequency_hz, dbm
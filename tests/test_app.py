@@ -0,0 +1,83 @@
+import pytest
+
+import app
+
+
+class _FakeProcess:
+    def __init__(self, lines):
+        self.stdout = iter(lines)
+
+    def wait(self):
+        return 0
+
+
+class _RecordingEvent:
+    def __init__(self, analyzer):
+        self.analyzer = analyzer
+        self.published = []
+
+    def set(self):
+        # The reader also sets the event at EOF; only record newly published sweeps
+        sweep = self.analyzer._latest_sweep
+        if sweep is not None and not any(sweep is seen for seen in self.published):
+            self.published.append(sweep)
+
+
+def _interleaved_sweep(blocks_per_tuning=1):
+    """
+    Rows in hackrf_sweep's order: tunings f and f + 5 MHz, where every block
+    of a tuning reports [f, f+5] and [f+10, f+15].
+    """
+    start, stop = (int(mhz) for mhz in app.SCAN_RANGE_MHZ)
+    lines = []
+    for step in range(start, stop, 20):
+        for tuning in (step, step + 5):
+            for _ in range(blocks_per_tuning):
+                for hz_low in (tuning, tuning + 10):
+                    hz_low *= 1_000_000
+                    lines.append(f"2024-01-01, 12:00:00.000, {hz_low}, {hz_low + 5_000_000}, 100000.00, 20, -50.0\n".encode())
+    return lines
+
+
+def _published_sweeps(lines):
+    analyzer = app.RFAnalyzer.__new__(app.RFAnalyzer)
+    analyzer._latest_sweep = None
+    analyzer._sweep_message = ""
+    analyzer._sweep_ready = _RecordingEvent(analyzer)
+    process = _FakeProcess(lines)
+    analyzer.sweep_proc = process
+    analyzer._read_sweeps(process)
+    return analyzer._sweep_ready.published
+
+
+@pytest.mark.parametrize("blocks_per_tuning", [1, 3])
+def test_read_sweeps_publishes_whole_interleaved_sweeps(blocks_per_tuning):
+    sweep = _interleaved_sweep(blocks_per_tuning)
+    # A partial sweep before the first start, two full sweeps, then the start of a third
+    published = _published_sweeps(sweep[7:] + sweep + sweep + sweep[:1])
+
+    assert [len(rows) for rows in published] == [len(sweep), len(sweep)]
+    expected = {int(line.split(b',')[2]) for line in sweep}
+    for rows in published:
+        assert {int(line.split(b',')[2]) for line in rows} == expected
+
+
+def test_read_sweeps_drops_rows_spliced_with_status_output():
+    sweep = _interleaved_sweep()
+    spliced = sweep[3][:40] + b" 98030.1 MiB / 1.000 sec = 30.1 MiB/second\n"
+    published = _published_sweeps(sweep + sweep[:3] + [spliced] + sweep[4:] + sweep[:1])
+
+    assert len(published) == 2
+    assert spliced not in published[1]
+    assert len(published[1]) == len(sweep) - 1
+
+
+def test_analysis_cache_is_discarded_after_a_model_change(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'OLLAMA_CACHE_FILE', str(tmp_path / "ollama_cache.json"))
+    analyzer = app.RFAnalyzer.__new__(app.RFAnalyzer)
+    analyzer._analysis_cache = {(101.0, -20, 100000, 16, 20): ("NFM voice", "New settings: LNA gain 16, VGA gain 20")}
+    analyzer._save_analysis_cache()
+
+    assert analyzer._load_analysis_cache() == analyzer._analysis_cache
+    monkeypatch.setitem(app.OLLAMA_CACHE_SIGNATURE, 'model', "another:1b")
+    assert analyzer._load_analysis_cache() == {}
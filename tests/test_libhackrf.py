@@ -0,0 +1,39 @@
+import ctypes
+
+import numpy as np
+
+import libhackrf
+
+
+def _block(frequency_hz, rng):
+    block = rng.integers(-64, 64, libhackrf.BYTES_PER_BLOCK, dtype=np.int8).view(np.uint8)
+    block[0:2] = 0x7F
+    block[2:10] = np.frombuffer(frequency_hz.to_bytes(8, 'little'), dtype=np.uint8)
+    return block
+
+
+def _feed(sweep, blocks, blocks_per_transfer):
+    for i in range(0, len(blocks), blocks_per_transfer):
+        data = np.concatenate(blocks[i:i + blocks_per_transfer])
+        buffer = (ctypes.c_uint8 * len(data)).from_buffer(data)
+        transfer = libhackrf._Transfer(
+            buffer=ctypes.cast(buffer, ctypes.POINTER(ctypes.c_uint8)),
+            buffer_length=len(data), valid_length=len(data)
+        )
+        sweep._on_transfer(ctypes.pointer(transfer))
+
+
+def test_on_transfer_publishes_whole_sweeps_with_several_blocks_per_tuning(monkeypatch):
+    monkeypatch.setattr(libhackrf, '_load_library', lambda: None)
+    sweep = libhackrf.HackRFSweep(100, 140, 100000, 131072)
+    rng = np.random.default_rng(0)
+
+    # Interleaved tunings f and f + 5 MHz per 20 MHz step, each sending three blocks with the same header
+    tunings = [mhz * 1_000_000 for step in (100, 120) for mhz in (step, step + 5)]
+    one_sweep = [_block(frequency, rng) for frequency in tunings for _ in range(3)]
+    # A partial sweep before the first start, two full sweeps, then the start of a third
+    blocks = one_sweep[5:] + one_sweep + one_sweep + one_sweep[:3]
+    _feed(sweep, blocks, blocks_per_transfer=4)
+
+    assert sweep.sweep_count == 2
+    assert (sweep._latest != libhackrf.EMPTY_BIN).all()